@@ -66,26 +66,25 @@ ws_before_escape = ['(']
 ws_none_escape = ['*', '+']
 
 
+# compile all substitutions once, in the order they are applied. Marks are kept as
+# separate patterns (not one character class) as each pass sees the output of the previous one
+_pre_subs = [(re.compile(k), v) for k,v in r_pre.items()]
+_punct_subs = ([(re.compile(rf' {c} '), f'{c} ') for c in ws_after] +
+               [(re.compile(rf' {c} '), f' {c}') for c in ws_before] +
+               [(re.compile(rf' {c} '), f'{c}') for c in ws_none] +
+               [(re.compile(rf' \{c} '), f'{c} ') for c in ws_after_escape] +
+               [(re.compile(rf' \{c} '), f' {c}') for c in ws_before_escape] +
+               [(re.compile(rf' \{c} '), f'{c}') for c in ws_none_escape])
+_post_subs = [(re.compile(k), v) for k,v in r_post.items()]
+_subs = _pre_subs + _punct_subs + _post_subs
+_spaces = re.compile(' +')
+
+
 def standardize_punctuation(t, lower=True):
-    for k,v in r_pre.items():
-        t = re.sub(k,v,t)
-    for c in ws_after:
-        t = re.sub(rf' {c} ', f'{c} ', t)
-    for c in ws_before:
-        t = re.sub(rf' {c} ', f' {c}', t)
-    for c in ws_none:
-        t = re.sub(rf' {c} ', f'{c}', t)
-    for c in ws_after_escape:
-        t = re.sub(rf' \{c} ', f'{c} ', t)
-    for c in ws_before_escape:
-        t = re.sub(rf' \{c} ', f' {c}', t)
-    for c in ws_none_escape:
-        t = re.sub(rf' \{c} ', f'{c}', t)
-    for k,v in r_post.items():
-        t = re.sub(k,v,t)
+    for pattern, repl in _subs:
+        t = pattern.sub(repl, t)
     if lower is True:
         t = t.lower()
-    t = re.sub(' +', ' ', t)
+    t = _spaces.sub(' ', t)
     t = t.strip()
     return t
-
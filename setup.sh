@@ -6,6 +6,9 @@ source ./env/bin/activate
 echo "[INFO]: Installing necessary reqs in env" 
 pip install -r requirements.txt
 
+echo "[INFO]: Installing repository as editable package (for src.* imports)"
+pip install -e .
+
 # upgrade for quantized mdls (if quantized mdls annoy)
 #echo "[INFO]: Upgrading and installing for Quantized Mdls"
 #pip install --upgrade transformers optimum 
@@ -4,15 +4,21 @@ Inspect data: check lengths of human versus AI
 
 import argparse
 import pathlib
-import sys
+import pickle
+from concurrent.futures import ProcessPoolExecutor, wait
 
+import matplotlib
+
+matplotlib.use("Agg")  # no display needed, figures are only saved
 import matplotlib.pyplot as plt
-import pandas as pd
+import numpy as np
+import pyarrow as pa
+import pyarrow.dataset as ds
 import seaborn as sns
 from matplotlib.colors import ListedColormap
 
-sys.path.append(str(pathlib.Path(__file__).parents[2]))
-from src.generate.generation import extract_min_max_tokens
+from src.utils import dataset_constants
+from src.utils.dataset_constants import extract_min_max_tokens
 
 DATASETS = [
     "dailydialog",
@@ -22,17 +28,110 @@ DATASETS = [
 ]  # nb not the same order as other scripts
 
 
+def load_min_max_tokens(cache_path, datasets=DATASETS):
+    """
+    Load min, max tokens for each dataset from a pickled cache. 
+    Recomputes (and re-caches) if the cache is missing, stale (older than src/utils/dataset_constants.py) or lacks a dataset.
+
+    Args:
+        cache_path: path to pickled cache file
+        datasets: list of datasets
+
+    Returns:
+        min_max_tokens_dict: dict {dataset: (min_tokens, max_tokens)}
+    """
+    source_path = pathlib.Path(dataset_constants.__file__)
+
+    if cache_path.exists() and cache_path.stat().st_mtime >= source_path.stat().st_mtime:
+        min_max_tokens_dict = pickle.loads(cache_path.read_bytes())
+        if set(datasets) <= set(min_max_tokens_dict):
+            return min_max_tokens_dict
+
+    min_max_tokens_dict = {dataset: extract_min_max_tokens(dataset) for dataset in datasets}
+    cache_path.write_bytes(pickle.dumps(min_max_tokens_dict))
+
+    return min_max_tokens_dict
+
+
+def scan_lengths(paths, col="doc_length", batch_size=64_000):
+    """
+    Read parquet files as one dataset scan in record batches (reading only the needed cols) and compute min, max of col per (dataset, model) along the way. 
+    Memory is not bounded by the batch size: all batches are kept and returned as one dataframe, as plotting needs the full data.
+
+    Args:
+        paths: list of parquet files
+        col: column to compute min and max for
+        batch_size: number of rows per record batch
+
+    Returns:
+        min_max: dict {(dataset, model): (min, max)}
+        df: dataframe with only the dataset, model and col columns (for plotting)
+    """
+    columns = ["dataset", "model", col]
+    min_max = {}
+    batches = []
+
+    scan = ds.dataset([str(p) for p in paths], format="parquet")
+
+    for batch in scan.to_batches(columns=columns, batch_size=batch_size):
+        batches.append(batch)
+
+        # aggregate batch, then fold into running min, max
+        agg = (
+            pa.Table.from_batches([batch])
+            .group_by(["dataset", "model"])
+            .aggregate([(col, "min"), (col, "max")])
+            .to_pydict()
+        )
+        for dataset, model, batch_min, batch_max in zip(
+            agg["dataset"], agg["model"], agg[f"{col}_min"], agg[f"{col}_max"]
+        ):
+            if batch_min is None:  # all values of col are null for the group in this batch
+                continue
+
+            if (dataset, model) in min_max:
+                prev_min, prev_max = min_max[(dataset, model)]
+                batch_min, batch_max = min(prev_min, batch_min), max(prev_max, batch_max)
+            min_max[(dataset, model)] = (batch_min, batch_max)
+
+    # batches are already arrow buffers, so they are combined without copying and converted to pandas once
+    # (schema passed explicitly, so that a scan without any batches gives an empty df rather than an error)
+    schema = pa.schema([scan.schema.field(column) for column in columns])
+    df = pa.Table.from_batches(batches, schema=schema).to_pandas(self_destruct=True, split_blocks=True)
+
+    return min_max, df
+
+
+def get_group_arrays(df, col="doc_length"):
+    """
+    Split col into one array per (dataset, model) in a single groupby (in order of first appearance)
+
+    Returns:
+        arrays: dict {(dataset, model): np.ndarray}
+    """
+    return {
+        (dataset, model): group[col].to_numpy()
+        for (dataset, model), group in df.groupby(["dataset", "model"], sort=False)
+    }
+
+
 def plot_distribution_per_dataset(
-    df,
+    arrays,
     min_max_tokens_dict=None,
-    col="doc_length",
     bins=30,
     figsize=(12, 6),
     title="Doc Lengths by Framework",
     save_path=None,
     caption=False,
 ):
-    unique_datasets = df["dataset"].unique()
+    """
+    Plot histograms of lengths for each dataset (one subplot per dataset, one histogram per model)
+
+    Args:
+        arrays: dict {(dataset, model): values} (see get_group_arrays)
+        min_max_tokens_dict: dict {dataset: (min_tokens, max_tokens)} to plot as dashed lines
+    """
+    unique_datasets = list(dict.fromkeys(dataset for dataset, _ in arrays))
     num_datasets = len(unique_datasets)
     fig, axes = plt.subplots(2, 2, figsize=figsize)
     axes = axes.flatten()
@@ -54,17 +153,28 @@ def plot_distribution_per_dataset(
     }
 
     for i, dataset in enumerate(unique_datasets):
-        # filter dataframe for current dataset
-        dataset_df = df[df["dataset"] == dataset]
+        # arrays for current dataset
+        model_arrays = {
+            model: values for (ds_name, model), values in arrays.items() if ds_name == dataset
+        }
+
+        # bin edges shared across models so bars align (binned over the plotted range if there is one)
+        if dataset in custom_x_lims:
+            edges = np.linspace(*custom_x_lims[dataset], bins + 1)
+        else:
+            edges = np.histogram_bin_edges(np.concatenate(list(model_arrays.values())), bins=bins)
+        widths = np.diff(edges)
 
         # plot each hue (e.g., each model, but not human)
         ax = axes[i]
-        for j, (hue_val, hue_df) in enumerate(dataset_df.groupby("model", sort=False)):
+        for j, (hue_val, values) in enumerate(model_arrays.items()):
             if hue_val != "human":
-                ax.hist(
-                    x=col,
-                    bins=bins,
-                    data=hue_df,
+                counts, _ = np.histogram(values, bins=edges)
+                ax.bar(
+                    edges[:-1],
+                    counts,
+                    width=widths,
+                    align="edge",
                     alpha=0.8,
                     label=hue_val,
                     color=colormap[j],
@@ -72,12 +182,14 @@ def plot_distribution_per_dataset(
                 )
 
         #  plot human
-        human_df = dataset_df[dataset_df["model"] == "human"]
-        if not human_df.empty:
-            ax.hist(
-                x=col,
-                bins=bins,
-                data=human_df,
+        human_values = model_arrays.get("human")
+        if human_values is not None and len(human_values) > 0:
+            counts, _ = np.histogram(human_values, bins=edges)
+            ax.bar(
+                edges[:-1],
+                counts,
+                width=widths,
+                align="edge",
                 alpha=0.5,
                 label="human",
                 color="red",
@@ -127,7 +239,16 @@ def plot_distribution_per_dataset(
     )
 
     if save_path:
-        plt.savefig(save_path, bbox_inches="tight", dpi=300)
+        save_figure(fig, save_path)
+
+    return fig
+
+
+def save_figure(fig, save_path):
+    """
+    Render and save figure. Figures are picklable, so this can run in a worker process (see main) to keep rendering off the main loop
+    """
+    fig.savefig(save_path, bbox_inches="tight", dpi=300)
 
 
 def main():
@@ -139,47 +260,49 @@ def main():
 
     temperatures = [1]
 
-    min_max_tokens_dict = {}
-    for dataset in DATASETS:
-        min_max_tokens_dict[dataset] = extract_min_max_tokens(dataset)
+    min_max_tokens_dict = load_min_max_tokens(save_dir / "min_max.pkl")
 
-    for temp in temperatures:
-        # read in data
-        datapath = path.parents[2] / "datasets_complete" / "metrics" / f"temp_{temp}"
+    futures = []
+    with ProcessPoolExecutor(max_workers=1) as executor:
+        for temp in temperatures:
+            # read in data
+            datapath = path.parents[2] / "datasets_complete" / "metrics" / f"temp_{temp}"
 
-        dfs = []
-        for split in ["train", "val", "test"]:
-            df = pd.read_parquet(datapath / f"{split}_metrics.parquet")
-            dfs.append(df)
+            # stream splits, computing min and max per dataset and model while reading
+            paths = [datapath / f"{split}_metrics.parquet" for split in ["train", "val", "test"]]
+            min_max, df = scan_lengths(paths, col="doc_length")
+            print(len(df))
 
-        df = pd.concat(dfs, ignore_index=True)
-        print(len(df))
+            print(f"[INFO:] Preprocessing datasets for temperature: {temp} ...")
 
-        print(f"[INFO:] Preprocessing datasets for temperature: {temp} ...")
+            # get min max for each dataset only for model = human
+            for dataset in DATASETS:
+                min_doc_length, max_doc_length = min_max.get((dataset, "human"), (None, None))
+                print(
+                    f"[INFO:] Dataset: {dataset}, min doc length: {min_doc_length}, max doc length: {max_doc_length}"
+                )
 
-        # get min max for each dataset only for model = human
-        human_df = df[df["model"] == "human"]
+            # plot
+            print("[INFO:] Plotting data ...")
+            fig = plot_distribution_per_dataset(
+                get_group_arrays(df, col="doc_length"),
+                min_max_tokens_dict,
+                bins=30,
+                figsize=(12, 8),
+                title=f"Doc Lengths (Temperature: {temp})",
+                caption=True,
+            )
 
-        for dataset in DATASETS:
-            dataset_df = human_df[human_df["dataset"] == dataset]
-            min_doc_length = dataset_df["doc_length"].min()
-            max_doc_length = dataset_df["doc_length"].max()
-            print(
-                f"[INFO:] Dataset: {dataset}, min doc length: {min_doc_length}, max doc length: {max_doc_length}"
+            # save in worker so that rendering overlaps with loading the next temperature
+            futures.append(
+                executor.submit(save_figure, fig, save_dir / f"temp{temp}_doc_lengths.png")
             )
+            plt.close(fig)
 
-        # plot
-        print("[INFO:] Plotting data ...")
-        plot_distribution_per_dataset(
-            df,
-            min_max_tokens_dict,
-            col="doc_length",
-            bins=30,
-            figsize=(12, 8),
-            title=f"Doc Lengths (Temperature: {temp})",
-            save_path=save_dir / f"temp{temp}_doc_lengths.png",
-            caption=True,
-        )
+        # raise errors from workers (if any)
+        wait(futures)
+        for future in futures:
+            future.result()
 
     print("[INFO:] DONE!")
 
@@ -5,15 +5,14 @@ Run XGBOOST classifier for each dataset and temp combination, save results to /r
 import argparse
 import pathlib
 import pickle
-import sys
 
 import pandas as pd
 from xgboost import XGBClassifier
 
-sys.path.append(str(pathlib.Path(__file__).parents[2]))
 from src.utils.classify import (
     clf_pipeline,
     get_feature_importances,
+    get_transformed_X,
     plot_feature_importances,
 )
 from src.utils.cols_to_drop import get_cols_to_drop
@@ -39,12 +38,6 @@ def input_parse():
     return args
 
 
-def get_transformed_X(df, features, pca_model, scaler):
-    X_scaled = scaler.transform(df[features])
-    X = pca_model.transform(X_scaled)
-    return X
-
-
 def main():
     args = input_parse()
 
@@ -4,12 +4,10 @@ Run TFIDF classifier for each dataset and temp combination, save results to /res
 
 import argparse
 import pathlib
-import sys
 
 import pandas as pd
 from sklearn.feature_extraction.text import TfidfVectorizer
 
-sys.path.append(str(pathlib.Path(__file__).parents[2]))
 from sklearn.linear_model import LogisticRegression
 from src.utils.classify import clf_pipeline
 
@@ -4,14 +4,12 @@ Run XGBOOST classifier for each dataset and temp combination, save results to /r
 
 import argparse
 import pathlib
-import sys
 
 import pandas as pd
 
-sys.path.append(str(pathlib.Path(__file__).parents[2]))
 import pickle
 
-from src.utils.classify import clf_pipeline
+from src.utils.classify import clf_pipeline, get_transformed_X
 from src.utils.cols_to_drop import get_cols_to_drop
 from xgboost import XGBClassifier
 
@@ -58,12 +56,6 @@ def extract_top_features(feature_importances_df, top_n_features: int = 3):
     return top_features_df
 
 
-def get_transformed_X(df, features, pca_model, scaler):
-    X_scaled = scaler.transform(df[features])
-    X = pca_model.transform(X_scaled)
-    return X
-
-
 def main():
     args = input_parse()
 
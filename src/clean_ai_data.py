@@ -9,54 +9,32 @@ import re
 import pandas as pd
 from tqdm import tqdm
 
-from generate.generation import extract_min_max_tokens
+from src.utils.dataset_constants import DATASETS, extract_min_max_tokens, get_ai_paths
+from src.utils.io import read_ndjson, to_parquet, write_ndjson
 
+# regex patterns for clean_ai_df (compiled once at import rather than per call)
+_LEADING_WS_RE = re.compile(r"^\s+")
+_SPEAKER_RE = re.compile(r"^(a:|b:)")
+_NEWLINE_WS_RE = re.compile(r"(?:<newline>|\s)+")  # "<newline>" tokens and whitespace collapsed in one pass
 
-MODELS = ["beluga7b", "llama2_chat7b", "llama2_chat13b", "mistral7b"]
-PROMPT_NUMBERS = [21]
-DATASETS = ["dailymail_cnn", "stories", "mrpc", "dailydialog"]
-
-
-def get_ai_paths(
-    ai_dir: pathlib.Path, dataset: str = "dailydialog", temp: float | int = 1
-) -> list[pathlib.Path]:
-    """
-    Get all paths pertaining to a particular dataset (e.g., mrpc, dailymail_cnn, stories, dailydialog, etc.) for models
-    """
-    ai_paths = []
-
-    if temp and not isinstance(temp, (int, float)):
-        raise ValueError(f"Temperature must be a int or float, not {type(temp)}")
-    if PROMPT_NUMBERS and not isinstance(PROMPT_NUMBERS, list):
-        raise ValueError(f"Prompt number must be an list, not {type(PROMPT_NUMBERS)}")
-
-    for model_name in MODELS:
-        model_path = ai_dir / model_name
-
-        for prompt_number in PROMPT_NUMBERS:
-            file_identifier = f"{dataset}_prompt_{prompt_number}_temp{temp}.ndjson"
-            file_path = model_path / file_identifier
-            ai_paths.extend([file_path])
-
-    if len(ai_paths) == 0:
-        print(
-            f"[WARNING:] Length of ai paths is zero. Ensure that you have valid arguments."
-        )
-
-    return ai_paths
+# regex patterns for standardize_ai_data
+_PROMPT_COL_RE = re.compile(r"^prompt_(\d+)$")  # e.g., prompt_21 -> 21
+_COMPLETIONS_COL_RE = re.compile(r"^(.*)_completions$")  # e.g., beluga7b_completions -> beluga7b
 
 
 def clean_ai_df(df, col="completions"):
     """
     lowercase, remove irregular format to standardise to human datasets like in src/clean/clean_data.py
     """
-    df[col] = df[col].str.replace(r"^\s+", "", regex=True)  # rm space at beginning
-    df[col] = df[col].str.lower()  # lowercase
-    df[col] = df[col].str.replace(
-        r"^(a:|b:)", lambda m: m.group(1).upper(), regex=True
-    )  # convert a: or b: to A: or B:
-    df[col] = df[col].str.replace("<newline>", " ", regex=False)  # rm newline
-    df[col] = df[col].str.replace(r"\s+", " ", regex=True)  # rm extra spaces
+    df[col] = (
+        df[col]
+        .str.replace(_LEADING_WS_RE, "", regex=True)  # rm space at beginning
+        .str.lower()  # lowercase
+        .str.replace(
+            _SPEAKER_RE, lambda m: m.group(1).upper(), regex=True
+        )  # convert a: or b: to A: or B:
+        .str.replace(_NEWLINE_WS_RE, " ", regex=True)  # rm newline and extra spaces
+    )
 
     return df
 
@@ -72,30 +50,36 @@ def standardize_ai_data(ai_dfs: list[pd.DataFrame], clean: bool = True):
         ai_dfs: list of dataframes
     """
     for idx, df in enumerate(ai_dfs):
-        new_df = df.copy()
-
-        new_df["is_human"] = 0
-
-        # standardise prompt and completions cols
-        prompt_colname = [col for col in new_df.columns if col.startswith("prompt_")][
-            0
-        ]  # get column name that starts with prompt_ (e.g., prompt_1, prompt_2, ...)
-        new_df["prompt_number"] = prompt_colname.split("_")[1]  # extract numbers
-        new_df.rename(columns={prompt_colname: "prompt"}, inplace=True)
+        # standardise prompt and completions cols, found in a single pass over the cols (first match of each is used)
+        prompt_colname = prompt_number = mdl_colname = model = None
+
+        for col in df.columns:
+            if prompt_colname is None and (match := _PROMPT_COL_RE.match(col)):
+                prompt_colname, prompt_number = col, match.group(1)  # e.g., prompt_1, prompt_2, ...
+            elif mdl_colname is None and (match := _COMPLETIONS_COL_RE.match(col)):
+                mdl_colname, model = col, match.group(1)
+
+        if prompt_colname is None or mdl_colname is None:
+            raise ValueError(
+                f"Expected a prompt_<n> and a <model>_completions column, got {list(df.columns)}"
+            )
 
-        mdl_colname = [col for col in new_df.columns if col.endswith("_completions")][0]
-        new_df["model"] = re.sub(
-            r"_completions$", "", mdl_colname
-        )  # remove "_completions" from e.g., "beluga_completions"
-        new_df.rename(columns={mdl_colname: "completions"}, inplace=True)
+        # rename and add cols in one go (rename returns a new df, so no separate copy of the original is needed)
+        new_df = df.rename(
+            columns={prompt_colname: "prompt", mdl_colname: "completions"}
+        ).assign(
+            is_human=0,
+            prompt_number=prompt_number,
+            model=model,
+        )
 
-        # add temperature val to col
+        # add temperature val to col (params are identical within a file, so only parse each unique value once)
         if "sample_params" in df.columns:
-            new_df["temperature"] = df.sample_params.apply(
-                lambda x: (
-                    ast.literal_eval(x).get("temperature") if pd.notna(x) else None
-                )
-            )
+            temperatures = {
+                params: ast.literal_eval(params).get("temperature")
+                for params in df.sample_params.dropna().unique()
+            }
+            new_df["temperature"] = df.sample_params.map(temperatures)
 
         if clean:
             new_df = clean_ai_df(new_df)
@@ -154,12 +138,13 @@ def main():
                 file_name = p.name  # e.g., dailymail_cnn_prompt_21_temp1.ndjsonß
 
                 # read files, and save to "clean_data" but model name as folder name
-                df = pd.read_json(p, lines=True)
+                df = read_ndjson(p)
                 df = standardize_ai_data([df], clean=True)
                 df = drop_lengths(df[0], dataset) # unpack list, drop lengths
                 
-                # save to ndjson
-                df.to_json(file_dir / file_name, orient="records", lines=True)
+                # save to ndjson (legacy) and parquet
+                write_ndjson(df, file_dir / file_name, force_ascii=True)
+                to_parquet(df, (file_dir / file_name).with_suffix(".parquet"))
 
 if __name__ == "__main__":
     main()
@@ -1,9 +1,9 @@
 '''
 Functions for generating data with HF pipeline and vLLM
 '''
-import ndjson
 import pathlib
 from tqdm import tqdm
+import numpy as np
 import pandas as pd
 from datasets import Dataset
 from transformers.pipelines.pt_utils import KeyDataset
@@ -11,25 +11,8 @@ from vllm import SamplingParams
 import spacy
 import random
 
-def extract_min_max_tokens(dataset: str):
-    '''
-    Return a specific min, max tokens for a dataset
-
-    Args
-        dataset: name of dataset 
-    '''
-    valid_datasets = {
-        "dailymail_cnn": (6, 433),
-        "stories": (112, 1055),
-        "mrpc": (8, 47),
-        "dailydialog": (4, 112)
-    }
-
-    if dataset not in valid_datasets:
-        valid_datasets_str = ", ".join(valid_datasets.keys())
-        raise ValueError(f"Invalid dataset '{dataset}'. Choose from {valid_datasets_str}")
-
-    return valid_datasets[dataset]
+from src.utils.dataset_constants import extract_min_max_tokens # re-exported for run_pipeline.py
+from src.utils.io import read_data, write_ndjson
 
 def login_hf_token(token_path=pathlib.Path(__file__).parents[2] / "tokens" / "hf_token.txt"): 
     '''
@@ -45,7 +28,7 @@ def login_hf_token(token_path=pathlib.Path(__file__).parents[2] / "tokens" / "hf
 
 def load_json_data(datafilepath:pathlib.Path(), n_subset:int=None):
     '''
-    Load ndjson data and optionally subset it. 
+    Load ndjson data and optionally subset it. Reads a parquet file with the same name instead (e.g., data.parquet) if it is not older than the ndjson file (see src/utils/io.py read_data)
 
     Args
         datafilepath: pathlib path to datafile 
@@ -55,10 +38,7 @@ def load_json_data(datafilepath:pathlib.Path(), n_subset:int=None):
         df: pandas dataframe 
     '''
     print("[INFO:] Loading data ...")
-    with open(datafilepath) as f:
-        data = ndjson.load(f)
-
-    df = pd.DataFrame(data)
+    df = read_data(datafilepath)
     
     if n_subset: 
         print(f"[INFO:] Data subsetted to size n = {n_subset}")
@@ -66,7 +46,7 @@ def load_json_data(datafilepath:pathlib.Path(), n_subset:int=None):
 
     return df 
 
-def hf_generate(hf_model, df:pd.DataFrame, prompt_col:str="prompt_1", min_len:int=112, max_tokens:int=1055, batch_size=1, sample_params:dict=None, outfilepath=None, cache_dir=None):
+def hf_generate(hf_model, df:pd.DataFrame, prompt_col:str="prompt_1", min_len:int=112, max_tokens:int=1055, batch_size=4, sample_params:dict=None, outfilepath=None, cache_dir=None):
     '''
     Generate data with instantiated hf_model using the custom Class FullModel or QuantizedModel (see models.py)
 
@@ -76,7 +56,7 @@ def hf_generate(hf_model, df:pd.DataFrame, prompt_col:str="prompt_1", min_len:in
         prompt_col: name of column to generate completions from 
         min_len: minimum length of the completion (output)
         max_tokens: maximum new tokens to be added 
-        batch_size: the amount of batches the data should be handled in (default to 1, i.e., no batching).
+        batch_size: number of prompts passed through the pipeline at once (defaults to 4). Use 1 to disable batching. When batching, prompts are processed in order of tokenized length to limit padding, and completions are returned in the original order.
         sample_params: if specified, will be used to do probabilistic decoding. 
         outfilepath: path where the file should be saved (defaults to none, not saving anything)
         cache_dir: path to load model if saved locally (defaults to None, downloading the model from the hub)
@@ -87,36 +67,45 @@ def hf_generate(hf_model, df:pd.DataFrame, prompt_col:str="prompt_1", min_len:in
     # intialize mdl
     hf_model.initialize_model(cache_dir=cache_dir)
 
+    # sort prompts by tokenized length so that each batch is padded as little as possible
+    if batch_size > 1:
+        lengths = hf_model.model.tokenizer(df[prompt_col].tolist(), add_special_tokens=False, return_length=True)["length"]
+        order = np.argsort(lengths, kind="stable")
+    else:
+        order = np.arange(len(df))
+
+    sorted_df = df.iloc[order]
+
     # convert to HF dataset for batching/streaming option
-    ds = Dataset.from_pandas(df)
+    ds = Dataset.from_pandas(sorted_df[[prompt_col]], preserve_index=False)
 
-    completions = []    
-    temp_counter = 0
+    completions = [None] * len(ds) # in sorted order 
     temp_threshold = batch_size*2 # threshold for amount of completions before it saves a remp file 
 
-    for out in tqdm(hf_model.model(KeyDataset(ds, prompt_col), min_length=min_len, max_new_tokens=max_tokens, batch_size=batch_size, **sample_params)): 
-        completion_txt = list(out[0].values())[0] # retrieve only raw text 
-        completions.append(completion_txt)
+    for idx, out in enumerate(tqdm(hf_model.model(KeyDataset(ds, prompt_col), min_length=min_len, max_new_tokens=max_tokens, batch_size=batch_size, **sample_params), total=len(ds))): 
+        completions[idx] = out[0]["generated_text"] # retrieve only raw text 
         
         if outfilepath: 
-            temp_counter += 1
-            if temp_counter % temp_threshold == 0:
+            n_done = idx + 1
+            if n_done % temp_threshold == 0:
                 print("[INFO]: Saving temp file...")
-                temp_df = df.iloc[:len(completions)].copy()
+                temp_df = sorted_df.iloc[:n_done].copy()
                 temp_df = temp_df.drop(columns=["human_completions", "source"], errors='ignore')
-                temp_df[f"{hf_model.chosen_model_name}_completions"] = completions
+                temp_df[f"{hf_model.chosen_model_name}_completions"] = completions[:n_done]
                 temp_df["sample_params"] = str(sample_params)
 
-                temp_df.to_json(outfilepath, orient="records", lines=True, force_ascii=False)
+                write_ndjson(temp_df, outfilepath)
 
-    # add completions + sample params
-    df[f"{hf_model.chosen_model_name}_completions"] = completions
+    # add completions (restored to original order with a single scatter by the sort order) + sample params
+    restored = np.empty(len(df), dtype=object)
+    restored[order] = completions
+    df[f"{hf_model.chosen_model_name}_completions"] = restored
     df["sample_params"] = str(sample_params)
     final_df = df.drop(columns=["human_completions", "source"])
 
     if outfilepath:
         print(f"[INFO]: Saving data to {outfilepath}...")
-        final_df.to_json(outfilepath, orient="records", lines=True, force_ascii=False)
+        write_ndjson(final_df, outfilepath)
 
     return final_df  
 
@@ -159,6 +148,8 @@ def vllm_generate(vllm_model, df:pd.DataFrame, prompt_col:str="prompt_1", min_to
     df["sample_params"] = str(sample_params)
 
     if min_tokens:
+        too_short_ids = []
+
         try: 
             print("[INFO]: Checking length of completions...")
             nlp = spacy.blank("en")
@@ -176,28 +167,38 @@ def vllm_generate(vllm_model, df:pd.DataFrame, prompt_col:str="prompt_1", min_to
                 sample_params_obj = SamplingParams(**sample_params)
                 too_short_outputs = vllm_model.model.generate(new_prompts, sample_params_obj)
 
+                # collect a valid completion (and its length) per id, then write all replacements to df at once
+                new_completions = {}
+                new_lengths = {}
                 for idx, output in enumerate(too_short_outputs):
-                    valid_completions = [comp.text for comp in output.outputs if len(nlp(comp.text)) >= min_tokens]
+                    valid_completions = []
+                    for comp in output.outputs:
+                        doc_length = len(nlp(comp.text))
+                        if doc_length >= min_tokens:
+                            valid_completions.append((comp.text, doc_length))
                     
                     if valid_completions:
-                        random_completion = random.choice(valid_completions)
                         completion_id = too_short_ids[idx]
-                        df.loc[df["id"] == completion_id, f"{vllm_model.chosen_model_name}_completions"] = random_completion
-                        df.loc[df["id"] == completion_id, "doc_length"] = len(nlp(random_completion))
+                        new_completions[completion_id], new_lengths[completion_id] = random.choice(valid_completions)
+
+                if new_completions:
+                    completions_by_id, lengths_by_id = pd.Series(new_completions), pd.Series(new_lengths)
+                    mask = df["id"].isin(completions_by_id.index)
+                    df.loc[mask, f"{vllm_model.chosen_model_name}_completions"] = df.loc[mask, "id"].map(completions_by_id)
+                    df.loc[mask, "doc_length"] = df.loc[mask, "id"].map(lengths_by_id)
 
-                # Check if there are still too short completions left
-                df["doc_length"] = df[f"{vllm_model.chosen_model_name}_completions"].apply(lambda x: len(nlp(x)))
+                # Check if there are still too short completions left (only replaced rows changed length)
                 too_short_ids = df[df["doc_length"] < min_tokens]["id"].tolist()
 
                 sample_params["n"] += 1  # Increment 'n' for the next iteration
             
-        except: 
-            print("[WARNING]: Error Occured. Likely CUDA problems.")
+        except Exception as e: # keep going on any error, so that the completions generated so far are still saved below
+            print(f"[WARNING]: Error Occured. Likely CUDA problems: {e}")
 
         if too_short_ids:
             print(f"[WARNING]: len({len(too_short_ids)}) completions still too short after max iterations.")
       
     if outfilepath is not None:
         print(f"[INFO]: Saving data to {outfilepath}...")
-        df.to_json(outfilepath, orient="records", lines=True, force_ascii=False)
+        write_ndjson(df, outfilepath)
 
@@ -1,6 +1,7 @@
 '''
 Script for loading model pipelines
 '''
+import gc
 from abc import ABC, abstractmethod
 from transformers import pipeline, AutoTokenizer, AutoModelForCausalLM
 import torch
@@ -85,6 +86,105 @@ class Model():
         else:
             return user_input
 
+def get_torch_dtype():
+    '''
+    Half precision dtype for inference: bfloat16 on GPUs that support it (e.g., A100, H100), float16 on older GPUs (e.g., V100) and float32 on CPU. 
+    '''
+    if torch.cuda.is_available():
+        return torch.bfloat16 if torch.cuda.is_bf16_supported() else torch.float16
+
+    return torch.float32
+
+def load_causal_lm(full_model_name, **kwargs):
+    '''
+    Load model with PyTorch's fused scaled dot product attention (SDPA) kernels, falling back to the default (eager) attention for architectures that do not support it yet.
+    '''
+    try:
+        return AutoModelForCausalLM.from_pretrained(full_model_name, attn_implementation="sdpa", **kwargs)
+    except (ValueError, ImportError) as e:
+        # transformers raises ValueError (architecture without SDPA) or ImportError (torch too old for SDPA) before loading any weights. 
+        # Only fall back for those, re-raise any other load error (e.g., bad config, dtype or revision)
+        error_msg = str(e)
+        if "scaled_dot_product_attention" not in error_msg and "SDPA" not in error_msg:
+            raise
+
+        print(f"[WARNING]: SDPA attention not available for {full_model_name} ({e}). Using default attention.")
+        return AutoModelForCausalLM.from_pretrained(full_model_name, **kwargs)
+
+# pipeline shared by model objects (e.g., across prompts or datasets in one session), see get_hf_pipeline(). Holds at most one pipeline.
+_PIPELINE_CACHE = {}
+
+def get_hf_pipeline(full_model_name, cache_dir=None, quantized=False):
+    '''
+    Get text-generation pipeline for full or quantized model, reusing the cached one if it was loaded with the same args.
+
+    Only one pipeline (full or quantized) is cached at a time: before a different one is loaded, the cached pipeline is dropped and the CUDA cache emptied. 
+    Its VRAM is only freed if no model object still holds it (i.e., the previous model object has been deleted).
+    '''
+    key = (full_model_name, cache_dir, quantized)
+
+    if key not in _PIPELINE_CACHE:
+        _PIPELINE_CACHE.clear()
+        gc.collect()
+        if torch.cuda.is_available():
+            torch.cuda.empty_cache()
+
+        load_pipeline = load_quantized_pipeline if quantized else load_full_pipeline
+        _PIPELINE_CACHE[key] = load_pipeline(full_model_name, cache_dir=cache_dir)
+
+    return _PIPELINE_CACHE[key]
+
+def load_full_pipeline(full_model_name, cache_dir=None):
+    '''
+    Load full (unquantized) model and tokenizer into a text-generation pipeline. Use get_hf_pipeline() to reuse an already loaded pipeline.
+    '''
+    # dtype has to be set when loading the weights (a torch_dtype passed to pipeline() is ignored when given an already loaded model)
+    model = load_causal_lm(full_model_name, cache_dir=cache_dir, device_map="auto", torch_dtype=get_torch_dtype())
+
+    tokenizer = AutoTokenizer.from_pretrained(full_model_name, cache_dir=cache_dir)
+
+    hf_pipeline = pipeline(
+            model=model,
+            tokenizer=tokenizer,
+            return_full_text=False,
+            task="text-generation"
+        )
+
+    # allow for padding (left-side for batched generation with decoder-only mdls)
+    hf_pipeline.tokenizer.pad_token_id = hf_pipeline.model.config.eos_token_id
+    hf_pipeline.tokenizer.padding_side = "left"
+
+    return hf_pipeline
+
+def load_quantized_pipeline(full_model_name, cache_dir=None):
+    '''
+    Load quantized GPTQ model and tokenizer into a text-generation pipeline. Use get_hf_pipeline() to reuse an already loaded pipeline.
+    '''
+    model = load_causal_lm(full_model_name,
+                           device_map="auto",
+                           trust_remote_code=False,
+                           revision="main",
+                           cache_dir=cache_dir,
+                           torch_dtype=get_torch_dtype(), # bfloat16 if supported
+                           low_cpu_mem_usage=True
+                           )
+        
+    tokenizer = AutoTokenizer.from_pretrained(full_model_name, use_fast=True, cache_dir=cache_dir)
+
+    hf_pipeline = pipeline(
+            model=model,
+            device_map="auto", # needs to be here and not in the model arg for quantized mdl 
+            tokenizer=tokenizer,
+            return_full_text=False,
+            task="text-generation"
+        )
+
+    # allow for padding (left-side for batched generation with decoder-only mdls)
+    hf_pipeline.tokenizer.pad_token_id = hf_pipeline.model.config.eos_token_id
+    hf_pipeline.tokenizer.padding_side = "left"
+
+    return hf_pipeline
+
 class FullModel(Model):
     '''
     Full, unquantized models (Beluga and Llama2)
@@ -95,20 +195,7 @@ class FullModel(Model):
             cache_dir: if cache_dir is specified, downloads model to cache_dir (or loads it if already downloaded). In case of any bugs, delete local folder.
         '''
         if self.model is None:
-            model = AutoModelForCausalLM.from_pretrained(self.full_model_name, cache_dir=cache_dir, device_map="auto")
-
-            tokenizer = AutoTokenizer.from_pretrained(self.full_model_name, cache_dir=cache_dir)
-
-            self.model = pipeline(
-                    model=model,  # get mdl name from base class
-                    torch_dtype=torch.bfloat16,
-                    tokenizer=tokenizer,
-                    return_full_text=False,
-                    task="text-generation"
-                )
-                
-            # allow for padding 
-            self.model.tokenizer.pad_token_id = self.model.model.config.eos_token_id
+            self.model = get_hf_pipeline(self.full_model_name, cache_dir=cache_dir) # get mdl name from base class
 
 class QuantizedModel(Model):
     '''
@@ -120,27 +207,7 @@ class QuantizedModel(Model):
             cache_dir: if cache_dir is specified, downloads model to cache_dir (or loads it if already downloaded). In case of any bugs, delete local folder.
         '''
         if self.model is None: 
-            model = AutoModelForCausalLM.from_pretrained(self.full_model_name,
-                                                device_map="auto",
-                                                trust_remote_code=False,
-                                                revision="main",
-                                                cache_dir=cache_dir, 
-                                                torch_dtype=torch.bfloat16, # changed to bfloat16
-                                                low_cpu_mem_usage=True
-                                                )
-                
-            tokenizer = AutoTokenizer.from_pretrained(self.full_model_name, use_fast=True, cache_dir=cache_dir)
-        
-            self.model = pipeline(
-                    model=model,
-                    device_map="auto", # needs to be here and not in the model arg for quantized mdl 
-                    tokenizer=tokenizer,
-                    return_full_text=False,
-                    task="text-generation"
-                )
-
-            # allow for padding 
-            self.model.tokenizer.pad_token_id = self.model.model.config.eos_token_id
+            self.model = get_hf_pipeline(self.full_model_name, cache_dir=cache_dir, quantized=True)
 
 class vLLM_Model(Model):
     '''
@@ -153,4 +220,4 @@ class vLLM_Model(Model):
             # get available gpus
             available_gpus = len([torch.cuda.device(i) for i in range(torch.cuda.device_count())])
 
-            self.model = LLM(self.full_model_name, download_dir=cache_dir, tensor_parallel_size=available_gpus, seed=seed, enforce_eager=True, dtype="bfloat16")
\ No newline at end of file
+            self.model = LLM(self.full_model_name, download_dir=cache_dir, tensor_parallel_size=available_gpus, seed=seed, enforce_eager=True, dtype=str(get_torch_dtype()).replace("torch.", ""))
\ No newline at end of file
@@ -85,19 +85,8 @@ def add_prompts_to_df(model, df, dataset:str="stories", prompt_number=1):
     # get task prompt
     task_prompt = get_task_prompt(dataset=dataset, prompt_number=prompt_number)
 
-    formatted_prompts = []
-
-    for row in df.itertuples():
-        source_text = row.source
-
-         # define user prompt (task prompt + text e.g., ""summarize this: 'I love language models'")
-        user_prompt = task_prompt + source_text
-
-        # extract formatted prompt with model (if model has not system prompt, this step will do nothing)
-        final_prompt = model.format_prompt(user_prompt)
-
-        formatted_prompts.append(final_prompt)
-
-    df[f"prompt_{prompt_number}"] = formatted_prompts
+    # define user prompt (task prompt + text e.g., ""summarize this: 'I love language models'"), then extract formatted prompt with model (if model has not system prompt, this step will do nothing)
+    # iterates over the source col only (rather than building a namedtuple per row with itertuples)
+    df[f"prompt_{prompt_number}"] = [model.format_prompt(task_prompt + source_text) for source_text in df["source"].tolist()]
 
     return df
\ No newline at end of file
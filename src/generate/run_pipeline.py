@@ -34,7 +34,7 @@ def input_parse():
     parser.add_argument("-prompt_n", "--prompt_number", help = "choose which prompt to use", type = int, default = 1)
     parser.add_argument("-subset", "--data_subset", help = "how many rows you want to include. Useful for testing. Defaults to None.", type = int, default=None)
     parser.add_argument("-temperature", "--temperature", help = "temperature for decoding. Defaults to 1.", type = float, default=1)
-    parser.add_argument("-batch", "--batch_size", help = "Batching of dataset. Only for HF for processing in parallel for GPU. Defaults to no batching (batch size of 1). ", type = int, default=1)
+    parser.add_argument("-batch", "--batch_size", help = "Batching of dataset. Only for HF for processing in parallel for GPU. Defaults to a batch size of 4. ", type = int, default=4)
     parser.add_argument("-hf", "--use_hf_pipeline", help="Use HF pipeline if set, otherwise use vLLM", action='store_true')
 
     # save arguments to be parsed from the CLI
@@ -5,7 +5,7 @@ Script to print min and max doc length of human datasets for systematically sett
 import argparse
 import pathlib
 
-import pandas as pd
+from src.utils.io import load_saved
 
 
 def input_parse():
@@ -26,14 +26,22 @@ def input_parse():
     return args
 
 
-def get_min_max_doc_length(datapath, filename):
-    # define paths
-    source_file = datapath / f"{filename}_source.csv"
-    completions_file = datapath / f"{filename}_completions.csv"
+def load_doc_lengths(datapath, name):
+    """
+    Load doc_length col of saved metrics (parquet, or csv if saved with extract_metrics.py -csv)
+    """
+    for suffix in [".parquet", ".csv"]:
+        file = datapath / f"{name}{suffix}"
+        if file.exists():
+            return load_saved(file, columns=["doc_length"])
+
+    raise FileNotFoundError(f"No saved metrics for '{name}' (.parquet or .csv) in {datapath}")
+
 
+def get_min_max_doc_length(datapath, filename):
     # load files
-    source = pd.read_csv(source_file)
-    completions = pd.read_csv(completions_file)
+    source = load_doc_lengths(datapath, f"{filename}_source")
+    completions = load_doc_lengths(datapath, f"{filename}_completions")
 
     # get dictionary
     min_lengths = {
@@ -46,13 +54,9 @@ def get_min_max_doc_length(datapath, filename):
 
 
 def get_median_doc_length(datapath, filename):
-    # define paths
-    source_file = datapath / f"{filename}_source.csv"
-    completions_file = datapath / f"{filename}_completions.csv"
-
     # load files
-    source = pd.read_csv(source_file)
-    completions = pd.read_csv(completions_file)
+    source = load_doc_lengths(datapath, f"{filename}_source")
+    completions = load_doc_lengths(datapath, f"{filename}_completions")
 
     # get dictionary
     median_lengths = {
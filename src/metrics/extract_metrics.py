@@ -4,47 +4,58 @@ See metrics/README.md for instructions on how to run.
 """
 
 import multiprocessing as mp
+import os
 import pathlib
-import sys
 from argparse import ArgumentParser
+from concurrent.futures import ThreadPoolExecutor
 
 import pandas as pd
 
-sys.path.append(str(pathlib.Path(__file__).parents[2]))
-from src.utils.get_metrics import get_all_metrics, get_information_metrics
+from src.utils.dataset_constants import extract_min_max_tokens, get_ai_paths
+from src.utils.get_metrics import (
+    get_all_metrics,
+    get_all_metrics_multi,
+    get_information_metrics,
+    load_td_pipeline,
+)
+from src.utils.io import load_saved, read_data, save_atomic
 
-MODELS = ["beluga7b", "llama2_chat7b", "llama2_chat13b", "mistral7b"]
-PROMPT_NUMBERS = [21]
-DATASETS = ["dailymail_cnn", "stories", "mrpc", "dailydialog"]
 
-
-def get_ai_paths(
-    ai_dir: pathlib.Path, dataset: str = "dailydialog", temp: float | int = 1
-) -> list[pathlib.Path]:
+def get_available_cores(reserve: int = 1) -> int:
     """
-    Get all paths pertaining to a particular dataset (e.g., mrpc, dailymail_cnn, stories, dailydialog, etc.) for models
+    Get number of cores this process may use (respecting CPU affinity e.g., from cgroups/containers and SLURM allocations) minus reserved cores
+
+    Args:
+        reserve: number of cores to keep free (for safety)
     """
-    ai_paths = []
+    if hasattr(os, "sched_getaffinity"):
+        n_cores = len(os.sched_getaffinity(0))
+    else:  # not available on e.g., Windows, macOS
+        n_cores = mp.cpu_count()
 
-    if temp and not isinstance(temp, (int, float)):
-        raise ValueError(f"Temperature must be a int or float, not {type(temp)}")
-    if PROMPT_NUMBERS and not isinstance(PROMPT_NUMBERS, list):
-        raise ValueError(f"Prompt number must be an list, not {type(PROMPT_NUMBERS)}")
+    slurm_cpus = os.environ.get("SLURM_CPUS_PER_TASK")
+    if slurm_cpus:
+        n_cores = min(n_cores, int(slurm_cpus))
 
-    for model_name in MODELS:
-        model_path = ai_dir / model_name
+    return max(1, n_cores - reserve)
 
-        for prompt_number in PROMPT_NUMBERS:
-            file_identifier = f"{dataset}_prompt_{prompt_number}_temp{temp}.ndjson"
-            file_path = model_path / file_identifier
-            ai_paths.extend([file_path])
 
-    if len(ai_paths) == 0:
-        print(
-            f"[WARNING:] Length of ai paths is zero. Ensure that you have valid arguments."
-        )
+def get_pipe_batch_size(dataset: str, tokens_per_batch: int = 4096) -> int:
+    """
+    Get batch size for spaCy's nlp.pipe so that each batch holds roughly the same amount of tokens across datasets
+    (i.e., small batches for long documents like stories, large batches for short documents like mrpc)
+
+    Args:
+        dataset: name of dataset
+        tokens_per_batch: approximate number of tokens per batch
 
-    return ai_paths
+    Returns:
+        batch_size: number of documents per batch
+    """
+    min_tokens, max_tokens = extract_min_max_tokens(dataset)
+    avg_tokens = (min_tokens + max_tokens) // 2
+
+    return max(1, tokens_per_batch // avg_tokens)
 
 
 def get_ai_metrics(
@@ -56,9 +67,13 @@ def get_ai_metrics(
     dataset: str = "mrpc",
     temp: int | float = 1,
     batch_size: int = 1,
+    pipe_batch_size: int = None,
     n_process: int = 1,
     compute_perplexity: bool = True,
     save_dir=None,
+    nlp=None,
+    force: bool = False,
+    save_format: str = "parquet",
 ):
     """
     Extract metrics for AI completions
@@ -68,26 +83,46 @@ def get_ai_metrics(
         dataset: name of dataset to extract metrics for
         temp: temperature of completions
         batch_size: batch size for processing
+        pipe_batch_size: batch size for spaCy's nlp.pipe. If None, uses batch_size.
         n_process: number of processes to use for multiprocessing
         compute_perplexity: whether to compute perplexity and entropy manually with GPT-2 (True) or relying on textdescriptives (False)
         save_dir: path to save directory. If None, does not save.
+        nlp: spaCy pipeline with textdescriptives components (see load_td_pipeline). If None, loads a new one.
+        force: whether to recompute metrics even if they are already saved in save_dir
+        save_format: file format of saved metrics, either "parquet" or "csv"
 
     Returns:
         completions_df: dataframe with metrics for completions
     """
+    # skip if already computed
+    save_file = (
+        save_dir / f"{dataset}_completions_temp{temp}.{save_format}" if save_dir else None
+    )
+
+    if save_file and save_file.exists() and not force:
+        print(f"[INFO:] Loading already computed metrics from {save_file} ...")
+        return load_saved(save_file)
+
     # get paths, only for prompt_numbers 21 (as they are the 2.0 prompts that we settled on, but fn is capable of loading whatever you want!)
     ai_paths = get_ai_paths(ai_dir=ai_dir, dataset=dataset, temp=temp)
-    ai_dfs = [pd.read_json(ai_path, lines=True) for ai_path in ai_paths]
+
+    # read files in parallel (I/O bound, and pyarrow releases the GIL while parsing). map preserves order of ai_paths
+    with ThreadPoolExecutor(max_workers=max(1, min(8, len(ai_paths)))) as executor:
+        ai_dfs = list(executor.map(read_data, ai_paths))  # reads parquet if available
 
     # concat
     ai_df = pd.concat(ai_dfs, ignore_index=True, axis=0)
 
-    # drop doc length (as metrics adds it, and will get confused when it has two cols that are duplicate)
-    ai_df = ai_df.drop(columns=["doc_length"])
+    # drop doc length in place (as metrics adds it, and will get confused when it has two cols that are duplicate)
+    del ai_df["doc_length"]
 
     # extract metrics
     completions_df = get_all_metrics(
-        ai_df, text_column="completions", batch_size=batch_size, n_process=n_process
+        ai_df,
+        text_column="completions",
+        batch_size=pipe_batch_size or batch_size,
+        n_process=n_process,
+        nlp=nlp,
     )
 
     if compute_perplexity:
@@ -111,8 +146,8 @@ def get_ai_metrics(
             loc=1, column="model", value=completions_df.pop("model")
         )  # insert mdl col on 2nd position in df
 
-    if save_dir:
-        completions_df.to_csv(save_dir / f"{dataset}_completions_temp{temp}.csv")
+    if save_file:
+        save_atomic(completions_df, save_file)
 
     return completions_df
 
@@ -121,9 +156,13 @@ def get_human_metrics(
     human_dir,
     dataset: str = "mrpc",
     batch_size: int = 1,
+    pipe_batch_size: int = None,
     n_process: int = 1,
     compute_perplexity: bool = True,
     save_dir=None,
+    nlp=None,
+    force: bool = False,
+    save_format: str = "parquet",
 ):
     """
     extract metrics for human data
@@ -132,33 +171,47 @@ def get_human_metrics(
         human_dir: path to directory with human data
         dataset: name of dataset to extract metrics for
         batch_size: batch size for processing
+        pipe_batch_size: batch size for spaCy's nlp.pipe. If None, uses batch_size.
         n_process: number of processes to use for multiprocessing
         compute_perplexity: whether to compute perplexity and entropy manually with GPT-2 (True) or relying on textdescriptives (False)
         save_dir: path to save directory. If None, does not save.
+        nlp: spaCy pipeline with textdescriptives components (see load_td_pipeline). If None, loads a new one.
+        force: whether to recompute metrics even if they are already saved in save_dir
+        save_format: file format of saved metrics, either "parquet" or "csv"
 
     Returns:
         source_df: dataframe with metrics for source text
         completions_df: dataframe with metrics for completions
     """
+    # skip if already computed
+    if save_dir:
+        save_files = [
+            save_dir / f"{dataset}_source.{save_format}",
+            save_dir / f"{dataset}_completions.{save_format}",
+        ]
+
+        if all(f.exists() for f in save_files) and not force:
+            print(f"[INFO:] Loading already computed metrics from {save_dir} ...")
+            return tuple(load_saved(f) for f in save_files)
+
     # def paths
     human_path = human_dir / dataset / "data.ndjson"
 
     # load df
-    human_df = pd.read_json(human_path, lines=True)
+    human_df = read_data(human_path)  # reads parquet if available
 
     # add model col
     human_df["model"] = "human"
 
-    # process source, completions
-    source_df = get_all_metrics(
-        human_df, text_column="source", batch_size=batch_size, n_process=n_process
-    )
-    completions_df = get_all_metrics(
+    # process source, completions (in one pass through the pipeline)
+    metrics_dfs = get_all_metrics_multi(
         human_df,
-        text_column="human_completions",
-        batch_size=batch_size,
+        text_columns=["source", "human_completions"],
+        batch_size=pipe_batch_size or batch_size,
         n_process=n_process,
+        nlp=nlp,
     )
+    source_df, completions_df = metrics_dfs["source"], metrics_dfs["human_completions"]
 
     # compute perplexity and entropy manually
     if compute_perplexity:
@@ -186,8 +239,8 @@ def get_human_metrics(
             )  # insert mdl col on 2nd position in df
 
     if save_dir:
-        source_df.to_csv(save_dir / f"{dataset}_source.csv")
-        completions_df.to_csv(save_dir / f"{dataset}_completions.csv")
+        save_atomic(source_df, save_files[0])
+        save_atomic(completions_df, save_files[1])
 
     return source_df, completions_df
 
@@ -208,6 +261,12 @@ def input_parse():
     parser.add_argument("-human_only", default=False, action="store_true")
     parser.add_argument("-ai_only", default=False, action="store_true")
 
+    # recompute metrics even if they have already been saved
+    parser.add_argument("-force", default=False, action="store_true")
+
+    # save metrics as csv instead of parquet (e.g., for external tools)
+    parser.add_argument("-csv", default=False, action="store_true")
+
     args = parser.parse_args()
 
     return args
@@ -225,9 +284,35 @@ def main():
     metrics_path.mkdir(parents=True, exist_ok=True)
 
     # get cores for multiprocessing (-1 for safety)
-    n_cores = mp.cpu_count() - 1
+    n_cores = get_available_cores(reserve=1)
     batch_size = 100
 
+    save_format = "csv" if args.csv else "parquet"
+
+    # spaCy batch size scaled to the document lengths of the dataset
+    pipe_batch_size = get_pipe_batch_size(args.dataset)
+
+    temps = [1, 1.5]
+
+    # metrics files this run needs (already saved files are loaded instead of recomputed, unless -force)
+    save_files = []
+    if not args.human_only:
+        save_files += [
+            metrics_path / "ai_metrics" / f"{args.dataset}_completions_temp{temp}.{save_format}"
+            for temp in temps
+        ]
+    if args.human_only or not args.ai_only:
+        save_files += [
+            metrics_path / "human_metrics" / f"{args.dataset}_{split}.{save_format}"
+            for split in ["source", "completions"]
+        ]
+
+    # load spaCy pipeline once (only if anything needs computing) and reuse across all calls (forked workers inherit it)
+    if args.force or not all(f.exists() for f in save_files):
+        nlp = load_td_pipeline(use_gpu=n_cores == 1)
+    else:
+        nlp = None  # not used, all metrics are loaded from save files
+
     # HUMAN PROCESSING
     if args.human_only:
         print(f"[INFO:] Processing HUMAN dataset for '{args.dataset}'")
@@ -235,29 +320,31 @@ def main():
             human_dir=human_dir,
             dataset=args.dataset,
             batch_size=batch_size,
+            pipe_batch_size=pipe_batch_size,
             n_process=n_cores,
             compute_perplexity=True,  
             save_dir=metrics_path / "human_metrics",
+            nlp=nlp,
+            force=args.force,
+            save_format=save_format,
         )
 
     else:
         # AI PROCESSING
-        for temp in [1, 1.5]:
+        for temp in temps:
             print(f"[INFO]: Processing AI datasets for '{args.dataset}'")
-            ai_savefile = (
-                metrics_path
-                / "ai_metrics"
-                / f"{args.dataset}_completions_temp{temp}.csv"
-            )
-
             ai_metrics_df = get_ai_metrics(
                 ai_dir=ai_dir,
                 dataset=args.dataset,
                 temp=temp,
                 batch_size=batch_size,
+                pipe_batch_size=pipe_batch_size,
                 compute_perplexity=True,  # for now until we decide on a model
                 n_process=n_cores,
                 save_dir=metrics_path / "ai_metrics",
+                nlp=nlp,
+                force=args.force,
+                save_format=save_format,
             )
 
         if not args.ai_only:  # if args_ai_only not specified, then run human also!
@@ -266,9 +353,13 @@ def main():
                 human_dir=human_dir,
                 dataset=args.dataset,
                 batch_size=20,
+                pipe_batch_size=pipe_batch_size,
                 n_process=n_cores,
                 compute_perplexity=True,  # for now until we decide on a model
                 save_dir=metrics_path / "human_metrics",
+                nlp=nlp,
+                force=args.force,
+                save_format=save_format,
             )
 
 
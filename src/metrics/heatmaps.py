@@ -3,14 +3,12 @@ create correlation heat maps
 """
 
 import pathlib
-import sys
 
 import matplotlib.pyplot as plt
 import numpy as np
 import pandas as pd
 import seaborn as sns
 
-sys.path.append(str(pathlib.Path(__file__).parents[2]))
 from src.utils.cols_to_drop import get_cols_to_drop
 
 
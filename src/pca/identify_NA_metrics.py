@@ -5,10 +5,7 @@ Since PCA cannot handle NA, we need to identify rows with NA metrics. In additio
 Even though we are creating seperate classifiers for each dataset, we still want to compare PCA components across datasets. Therefore, the same metrics should be dropped across all datasets.
 '''
 import pathlib
-import sys
-import pandas as pd
-sys.path.append(str(pathlib.Path(__file__).parents[2]))
-from src.utils.process_metrics import load_metrics
+import pyarrow.dataset as ds
 
 def identify_NA_metrics(df, percent_zero:float=None):
     '''
@@ -43,13 +40,11 @@ def main():
         / f"temp_{temp}"
     )
 
-    # load train metrics data
-    train_df = pd.read_parquet(datapath / "train_metrics.parquet")
-    val_df = pd.read_parquet(datapath / "val_metrics.parquet")
-    test_df = pd.read_parquet(datapath / "test_metrics.parquet")
-
-    # combine
-    df = pd.concat([train_df, val_df, test_df], ignore_index=True)
+    # load train, val, test metrics as one arrow table (no intermediate dfs to concat), then convert once
+    paths = [str(datapath / f"{split}_metrics.parquet") for split in ["train", "val", "test"]]
+    table = ds.dataset(paths, format="parquet").to_table()
+    df = table.to_pandas(self_destruct=True, split_blocks=True)
+    del table
 
 
     # drop type cols first (since they are not what should determine what features to drop)
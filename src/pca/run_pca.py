@@ -4,20 +4,18 @@ Run PCA on train data (metrics) and save results to /results/classify/pca_result
 
 import pathlib
 import pickle
-import sys
 
 import pandas as pd
 from sklearn.decomposition import PCA
 from sklearn.preprocessing import StandardScaler
 from tqdm import tqdm
 
-sys.path.append(str(pathlib.Path(__file__).parents[2]))
 from src.utils.cols_to_drop import get_cols_to_drop
 from src.utils.pca_plots import (get_loadings, plot_cumulative_variance,
                                  plot_loadings)
 
 
-def run_PCA(df: pd.DataFrame, feature_names: list, random_state:int=129, n_components=None):
+def run_PCA(df: pd.DataFrame, feature_names: list, random_state:int=129, n_components=None, svd_solver:str="auto"):
     '''
     Run PCA on a list of feature names. Normalises features prior to running PCA.
     
@@ -26,6 +24,7 @@ def run_PCA(df: pd.DataFrame, feature_names: list, random_state:int=129, n_compo
         feature_names: List of column names to use for PCA.
         random_state: Random state for PCA. Default is 129.
         n_components: Number of principal components to keep. Default is None (keep all components).
+        svd_solver: PCA solver. Default is "auto": the randomized (Halko) solver with 5 power iterations if only some components are kept (int n_components), otherwise the exact full SVD.
         
     Returns:
         pca: The fitted PCA model.
@@ -34,7 +33,18 @@ def run_PCA(df: pd.DataFrame, feature_names: list, random_state:int=129, n_compo
     std_scaler = StandardScaler()
     scaled_df = std_scaler.fit_transform(df[feature_names]) # fit and transform on train data for PCA
 
-    pca_model = PCA(n_components=n_components, random_state=random_state) 
+    # randomized SVD only computes the kept components (O(n*p*k) rather than a full decomposition)
+    if svd_solver == "auto":
+        truncated = isinstance(n_components, int) and n_components < min(scaled_df.shape)
+        svd_solver = "randomized" if truncated else "full"
+
+    pca_model = PCA(
+        n_components=n_components,
+        svd_solver=svd_solver,
+        iterated_power=5 if svd_solver == "randomized" else "auto",
+        random_state=random_state,
+        copy=False, # centre scaled_df in place (it is a fresh array not used after fitting) rather than copying it again
+    ) 
     pca_model.fit(scaled_df) # only fit since we will transform train and test data with the model when we use it
 
     return pca_model, std_scaler
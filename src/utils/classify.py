@@ -7,11 +7,25 @@ import pathlib
 from datetime import datetime
 
 import matplotlib.pyplot as plt
+import numpy as np
 import pandas as pd
 import seaborn as sns
 from sklearn import metrics
 
 
+def get_transformed_X(df, features, pca_model, scaler):
+    """
+    Scale features and project them onto the principal components (scaler and pca_model fitted in src/pca/run_pca.py)
+
+    Returns:
+        X: C-contiguous float32 array (the layout XGBoost works in, so it is not converted again on every fit and predict)
+    """
+    X_scaled = scaler.transform(df[features])
+    X = pca_model.transform(X_scaled)
+
+    return np.ascontiguousarray(X, dtype=np.float32)
+
+
 def clf_pipeline(
     df,
     clf,
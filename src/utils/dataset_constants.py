@@ -0,0 +1,52 @@
+"""
+Dataset constants (and the AI data paths derived from them) shared across the pipeline (generation, cleaning, metrics and analysis)
+"""
+import pathlib
+
+# models, prompts (only prompt 21, the 2.0 prompt we settled on) and datasets of the AI generated data
+MODELS = ["beluga7b", "llama2_chat7b", "llama2_chat13b", "mistral7b"]
+PROMPT_NUMBERS = [21]
+DATASETS = ["dailymail_cnn", "stories", "mrpc", "dailydialog"]
+
+# min and max tokens for each dataset (used as generation params and for filtering completions on doc length)
+MIN_MAX_TOKENS = {
+    "dailymail_cnn": (6, 433),
+    "stories": (112, 1055),
+    "mrpc": (8, 47),
+    "dailydialog": (4, 112),
+}
+
+
+def extract_min_max_tokens(dataset: str):
+    """
+    Return a specific min, max tokens for a dataset
+
+    Args
+        dataset: name of dataset
+    """
+    if dataset not in MIN_MAX_TOKENS:
+        valid_datasets_str = ", ".join(MIN_MAX_TOKENS.keys())
+        raise ValueError(f"Invalid dataset '{dataset}'. Choose from {valid_datasets_str}")
+
+    return MIN_MAX_TOKENS[dataset]
+
+
+def get_ai_paths(
+    ai_dir: pathlib.Path, dataset: str = "dailydialog", temp: float | int = 1
+) -> list[pathlib.Path]:
+    """
+    Get all paths pertaining to a particular dataset (e.g., mrpc, dailymail_cnn, stories, dailydialog, etc.) for models
+
+    Args
+        ai_dir: directory with a folder per model
+        dataset: name of dataset
+        temp: temperature of completions
+    """
+    if temp and not isinstance(temp, (int, float)):
+        raise ValueError(f"Temperature must be a int or float, not {type(temp)}")
+
+    return [
+        ai_dir / model_name / f"{dataset}_prompt_{prompt_number}_temp{temp}.ndjson"
+        for model_name in MODELS
+        for prompt_number in PROMPT_NUMBERS
+    ]
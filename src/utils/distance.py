@@ -48,56 +48,46 @@ def compute_distances(df: pd.DataFrame, models: list = ["beluga7b", "llama2_chat
     Returns
         result_df: dataframe containing columns: id, model, dataset, distance, prompt_number
     '''
-    result_rows = []
-
     # subset df to include only the AI models
     df_other = df[df["model"].isin(models)]
 
-    # subset for baseline
-    df_baseline = df[df["model"] == baseline]
+    # subset for baseline, indexed by id for hashed lookups (first row per id, as only one baseline completion per id is used)
+    df_baseline = df[df["model"] == baseline].drop_duplicates("id").set_index("id")
 
-    for _, row in tqdm(df_other.iterrows(), desc=f"Computing distances between {baseline} and the models in list {models}", total=df_other.shape[0]):
-        current_id = row["id"]
+    missing_ids = ~df_other["id"].isin(df_baseline.index)
+    if missing_ids.any():
+        raise ValueError(f"No {baseline} completions for ids: {df_other.loc[missing_ids, 'id'].unique().tolist()}")
 
-        # extract features for the "baseline" model with the same "id" as df_other 
-        pc_baseline = df_baseline[df_baseline["id"] == current_id][cols].values[0]
+    print(f"[INFO:] Computing distances between {baseline} and the models in list {models}")
 
-        # extract features for model completions
-        pc_model = row[cols].values
-        
-        # compute euclidean distance in n-dimensions
-        distance = euclidean_distance(pc_baseline, pc_model)
+    # align baseline features to the model rows by id, then compute euclidean distances in n-dimensions for all rows at once
+    pc_baseline = df_baseline[cols].reindex(df_other["id"]).to_numpy(dtype=float)
+    pc_models = df_other[cols].to_numpy(dtype=float)
+    distances = np.sqrt(np.sum((pc_models - pc_baseline) ** 2, axis=1))
 
-        result_row = {
-            "id": row["id"],
-            "model": row["model"],
-            "dataset": row["dataset"],
-            "distance": distance,
-            "prompt_number": row["prompt_number"],
-            "completions": row["completions"],
-        }
-        if "sample_params" in df.columns: 
-            result_row[f"sample_params"] = row["sample_params"]
+    result_cols = {
+        "id": df_other["id"].to_numpy(),
+        "model": df_other["model"].to_numpy(),
+        "dataset": df_other["dataset"].to_numpy(),
+        "distance": distances,
+        "prompt_number": df_other["prompt_number"].to_numpy(),
+        "completions": df_other["completions"].to_numpy(),
+    }
 
-        if "temperature" in df.columns:
-            result_row[f"temperature"] = row["temperature"]
+    if "sample_params" in df.columns: 
+        result_cols["sample_params"] = df_other["sample_params"].to_numpy()
 
-        if include_baseline_completions:
-            # extract baseline completion
-            baseline_completions = df_baseline[df_baseline["id"] == current_id]["completions"].values
-            
-            # unpack list (if there is one)
-            baseline_completion = baseline_completions[0] if len(baseline_completions) > 0 else None
+    if "temperature" in df.columns:
+        result_cols["temperature"] = df_other["temperature"].to_numpy()
 
-            # add to results
-            result_row[f"{baseline}_completions"] = baseline_completion
+    if include_baseline_completions:
+        # look up baseline completion per id 
+        result_cols[f"{baseline}_completions"] = df_other["id"].map(df_baseline["completions"]).to_numpy()
 
-        result_rows.append(result_row)
-
-    result_df = pd.DataFrame(result_rows)
+    result_df = pd.DataFrame(result_cols)
 
     # sort by id and model
-    sorted_df = result_df.copy().sort_values(["id", "model"])
+    sorted_df = result_df.sort_values(["id", "model"])
 
     return sorted_df
 
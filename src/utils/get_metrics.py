@@ -1,25 +1,65 @@
 '''
 utils script for extracting metrics
 '''
+import re
+
 import pandas as pd
 import spacy 
 import textdescriptives as td
 from evaluate import load
 import numpy as np
 
+# patterns for fast_descriptive_metrics
+_DOC_TOKEN_RE = re.compile(r"\w+|[^\w\s]+") # words and runs of punctuation (e.g., "..." is one token)
+_WORD_RE = re.compile(r"\w+") # words only
+_SENTENCE_RE = re.compile(r"[^.!?\s][^.!?]*(?:[.!?]+|$)") # text up to (and incl.) a run of .!? or the end of the doc
+
+
+def fast_descriptive_metrics(texts:pd.Series):
+    '''
+    Approximate doc_length, n_tokens, n_characters and n_sentences on raw strings without running a spaCy pipeline.
+
+    Counts are regex-based (e.g., no splitting of contractions, abbreviations end sentences), 
+    so they approximate rather than reproduce the textdescriptives metrics of get_descriptive_metrics(). 
 
-def get_descriptive_metrics(df:pd.DataFrame, text_column:str, spacy_mdl:str="en_core_web_md", batch_size:int=1, n_process:int=1):
+    Args:
+        texts: series of texts
+
+    Returns:
+        metrics_df: dataframe with cols doc_length, n_tokens, n_characters, n_sentences
+    '''
+    texts = texts.fillna("")
+
+    metrics_df = pd.DataFrame({
+        "doc_length": texts.str.count(_DOC_TOKEN_RE), # spaCy tokens incl. punctuation
+        "n_tokens": texts.str.count(_WORD_RE), # tokens excl. punctuation
+        "n_characters": texts.str.len() - texts.str.count(" "), # characters excl. spaces (like textdescriptives)
+        "n_sentences": texts.str.count(_SENTENCE_RE),
+    }, index=texts.index)
+
+    return metrics_df
+
+def get_descriptive_metrics(df:pd.DataFrame, text_column:str, spacy_mdl:str="en_core_web_sm", batch_size:int=64, n_process:int=1, fast:bool=False, nlp=None):
     '''
     Extract low level descriptive features doc_length, n_tokens, n_characters and n_sentences 
+
+    If fast is True, the metrics are approximated without spaCy (see fast_descriptive_metrics()). 
+    If nlp is None, spacy_mdl is loaded with only the components needed for the descriptive stats (tokenizer, tok2vec and parser for sentence boundaries).
+    Defaults to the small model as token and sentence counts need no word vectors.
     '''
-    # load nlp, add td to model
-    print(f"[INFO:] Loading SpaCY model '{spacy_mdl}'...")
-    nlp = spacy.load(spacy_mdl)
-    nlp.add_pipe("textdescriptives/descriptive_stats")
-    nlp.add_pipe("textdescriptives/quality")
+    if fast:
+        print(f"[INFO:] Approximating metrics for column '{text_column}' without spaCy ...")
+        return pd.concat([df, fast_descriptive_metrics(df[text_column])], axis=1, copy=False)
 
-    # pass txt to pipeline
+    if nlp is None:
+        # load nlp without components the descriptive stats do not rely on, add td to model
+        print(f"[INFO:] Loading SpaCY model '{spacy_mdl}'...")
+        nlp = spacy.load(spacy_mdl, exclude=["ner", "lemmatizer", "tagger", "attribute_ruler"])
+        nlp.add_pipe("textdescriptives/descriptive_stats")
+
+    # pass txt to pipeline (no more processes than there are batches to go around)
     text = df[text_column]
+    n_process = max(1, min(n_process, len(text) // batch_size))
     print(f"[INFO:] Passing text from column '{text_column}' to pipeline ...")
     docs = nlp.pipe(text, batch_size=batch_size, n_process=n_process)
 
@@ -28,34 +68,80 @@ def get_descriptive_metrics(df:pd.DataFrame, text_column:str, spacy_mdl:str="en_
 
     # subset metrics to only include low level features, then concat
     metrics_df = metrics_df[["doc_length", "n_tokens", "n_characters", "n_sentences"]]
-    final_df = pd.concat([df, metrics_df], axis=1)
+    final_df = pd.concat([df, metrics_df], axis=1, copy=False)
 
     return final_df
 
-def get_all_metrics(df:pd.DataFrame, text_column:str, spacy_mdl:str="en_core_web_md", batch_size:int=1, n_process:int=1):
+def load_td_pipeline(spacy_mdl:str="en_core_web_md", use_gpu:bool=False):
     '''
-    Extract all metrics using textdescriptives using nlp.pipe(). 
+    Load spaCy model with all textdescriptives components added. 
 
-    Same functionality as td.extract_metrics() but allows for multiprocessing. 
+    Load once and pass to get_all_metrics() to avoid reloading the model on every call.
+
+    Args:
+        spacy_mdl: name of spaCy model
+        use_gpu: whether to use GPU if available (spaCy does not support GPU with multiprocessing, so only use for n_process = 1)
     '''
-    # load nlp, add td to model
+    if use_gpu:
+        spacy.prefer_gpu()
+
+    # load nlp without components no td metric relies on (attribute_ruler is kept as it sets the POS tags for pos_prop_*), add td to model 
     print(f"[INFO:] Loading SpaCY model '{spacy_mdl}'...")
-    nlp = spacy.load(spacy_mdl)
+    nlp = spacy.load(spacy_mdl, exclude=["ner", "lemmatizer"])
     nlp.add_pipe("textdescriptives/all")
 
-    # pass txt to pipeline
-    text = df[text_column]
-    print(f"[INFO:] Passing text from column '{text_column}' to pipeline ...")
-    docs = nlp.pipe(text, batch_size=batch_size, n_process=n_process)
+    return nlp
 
-    print("[INFO:] Extracting metrics to df ...")
-    metrics_df = td.extract_df(docs, include_text=False) 
+def get_all_metrics(df:pd.DataFrame, text_column:str, spacy_mdl:str="en_core_web_md", batch_size:int=1, n_process:int=1, nlp=None):
+    '''
+    Extract all metrics using textdescriptives using nlp.pipe(). 
 
-    # sort columns alphabetically, then concat
-    metrics_df = metrics_df.reindex(sorted(metrics_df.columns), axis=1) 
-    final_df = pd.concat([df, metrics_df], axis=1)
+    Same functionality as td.extract_metrics() but allows for multiprocessing. 
+    If nlp (see load_td_pipeline()) is None, spacy_mdl is loaded with all textdescriptives components.
+    '''
+    final_dfs = get_all_metrics_multi(df, text_columns=[text_column], spacy_mdl=spacy_mdl, batch_size=batch_size, n_process=n_process, nlp=nlp)
 
-    return final_df
+    return final_dfs[text_column]
+
+def get_all_metrics_multi(df:pd.DataFrame, text_columns:list, spacy_mdl:str="en_core_web_md", batch_size:int=1, n_process:int=1, nlp=None):
+    '''
+    Extract all metrics for several text columns in a single nlp.pipe() pass (rather than one pass and worker pool per column). 
+
+    Args:
+        df: dataframe with text columns
+        text_columns: list of text columns to extract metrics for
+        spacy_mdl: name of spaCy model (only loaded if nlp is None)
+        batch_size: batch size for nlp.pipe()
+        n_process: number of processes for nlp.pipe()
+        nlp: spaCy pipeline with textdescriptives components (see load_td_pipeline())
+
+    Returns:
+        final_dfs: dict with a dataframe for each text column (df with the metrics of that column concatenated, like get_all_metrics())
+    '''
+    if nlp is None:
+        nlp = load_td_pipeline(spacy_mdl, use_gpu=n_process == 1)
+
+    # tag each text with its column so that docs can be split again after the pipeline
+    texts = [(text, col) for col in text_columns for text in df[col]]
+
+    # pass txt to pipeline (no more processes than there are batches to avoid idle workers)
+    n_process = max(1, min(n_process, len(texts) // batch_size))
+    print(f"[INFO:] Passing text from column(s) {text_columns} to pipeline (batch size: {batch_size}, processes: {n_process}) ...")
+    docs = nlp.pipe(texts, as_tuples=True, batch_size=batch_size, n_process=n_process)
+
+    print("[INFO:] Extracting metrics to df ...")
+    metrics = {col: [] for col in text_columns}
+    for doc, col in docs:
+        metrics[col].extend(td.extract_dict([doc], include_text=False))
+
+    final_dfs = {}
+    for col, rows in metrics.items():
+        # sort columns alphabetically when building the df (rather than reindexing a copy afterwards), then concat without copying df.
+        # columns are the union of keys across docs, as some metrics are only emitted for some docs (e.g., pos_prop_SPACE for docs with whitespace tokens)
+        metrics_df = pd.DataFrame(rows, columns=sorted(set().union(*rows)))
+        final_dfs[col] = pd.concat([df, metrics_df], axis=1, copy=False)
+
+    return final_dfs
 
 def convert_to_entropy(perplexity: float):
     '''
@@ -0,0 +1,140 @@
+"""
+Functions for reading and writing data files (ndjson, parquet)
+"""
+
+import os
+import pathlib
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.json as pj
+import pyarrow.parquet as pq
+
+
+def _table_to_pandas(table: pa.Table) -> pd.DataFrame:
+    """
+    Convert arrow table to pandas like pd.read_json/ndjson.load would load it: nested cols (lists, structs) become python lists and dicts
+    (rather than the numpy arrays of table.to_pandas(), which e.g., are saved as unparseable "array([...])" reprs in csv files)
+    """
+    df = table.to_pandas()
+
+    for name, col in zip(table.column_names, table.columns):
+        if pa.types.is_nested(col.type):
+            df[name] = col.to_pylist()
+
+    return df
+
+
+def read_ndjson(path: pathlib.Path) -> pd.DataFrame:
+    """
+    Read ndjson file with pyarrow's (multithreaded, columnar) json reader rather than parsing it line by line in Python
+
+    Args:
+        path: path to ndjson file
+    """
+    return _table_to_pandas(pj.read_json(path))
+
+
+def write_ndjson(df: pd.DataFrame, path: pathlib.Path, chunksize: int = 10_000, force_ascii: bool = False):
+    """
+    Write dataframe to ndjson in chunks of rows, so that only one chunk (rather than the entire file) is serialized to a string in memory at a time
+
+    Args:
+        df: dataframe to write
+        path: path to ndjson file
+        chunksize: number of rows serialized at a time
+        force_ascii: whether to escape non-ascii characters (see pd.DataFrame.to_json)
+    """
+    with open(path, "w", encoding="utf-8") as f:
+        for start in range(0, len(df), chunksize):
+            chunk = df.iloc[start : start + chunksize]
+            records = chunk.to_json(orient="records", lines=True, force_ascii=force_ascii)
+
+            # ensure exactly one newline between chunks (whether or not pandas adds a trailing one)
+            f.write(records.rstrip("\n"))
+            f.write("\n")
+
+
+def to_parquet(records, path: pathlib.Path):
+    """
+    Write data to parquet (zstd compressed, dictionary encoded)
+
+    Args:
+        records: dataframe or list of dicts
+        path: path to parquet file
+    """
+    df = records if isinstance(records, pd.DataFrame) else pd.DataFrame(records)
+
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    pq.write_table(table, path, compression="zstd", use_dictionary=True)
+
+
+def from_parquet(path: pathlib.Path, columns: list = None) -> pd.DataFrame:
+    """
+    Read parquet file
+
+    Args:
+        path: path to parquet file
+        columns: columns to read. If None, reads all columns.
+    """
+    return _table_to_pandas(pq.read_table(path, columns=columns))
+
+
+def read_data(path: pathlib.Path, columns: list = None) -> pd.DataFrame:
+    """
+    Read ndjson data file, preferring a parquet file with the same name (e.g., data.parquet over data.ndjson) if it is at least as new as the ndjson file or the ndjson file does not exist
+
+    Args:
+        path: path to ndjson file
+        columns: columns to read. If None, reads all columns.
+    """
+    path = pathlib.Path(path)
+    parquet_path = path.with_suffix(".parquet")
+
+    # only use the parquet file if it is not stale (i.e., the ndjson has not been regenerated or edited since)
+    if parquet_path.exists() and (
+        not path.exists() or parquet_path.stat().st_mtime >= path.stat().st_mtime
+    ):
+        return from_parquet(parquet_path, columns=columns)
+
+    df = read_ndjson(path)
+
+    return df[columns] if columns else df
+
+
+def save_atomic(df: pd.DataFrame, path: pathlib.Path):
+    """
+    Save dataframe to parquet (zstd compressed) or csv depending on the suffix of path. 
+    Writes to a temporary file that replaces path once fully written (so interrupted runs never leave partial files)
+
+    Args:
+        df: dataframe to save
+        path: path to .parquet or .csv file. Parent dirs are created if they do not exist.
+    """
+    path = pathlib.Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+
+    tmp_path = path.with_name(f"{path.name}.tmp")
+
+    if path.suffix == ".parquet":
+        df.to_parquet(tmp_path, engine="pyarrow", compression="zstd")
+    else:
+        df.to_csv(tmp_path)
+
+    os.replace(tmp_path, path)
+
+
+def load_saved(path: pathlib.Path, columns: list = None) -> pd.DataFrame:
+    """
+    Load dataframe saved with save_atomic()
+
+    Args:
+        path: path to .parquet or .csv file
+        columns: columns to read. If None, reads all columns.
+    """
+    if pathlib.Path(path).suffix == ".parquet":
+        return from_parquet(path, columns=columns)
+
+    df = pd.read_csv(path, index_col=0)
+
+    return df[columns] if columns else df
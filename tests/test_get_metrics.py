@@ -0,0 +1,41 @@
+"""
+Tests for the spaCy-free descriptive metrics in src/utils/get_metrics.py
+"""
+
+import pandas as pd
+import pytest
+
+from src.utils.get_metrics import fast_descriptive_metrics, get_descriptive_metrics
+
+
+@pytest.mark.parametrize(
+    "text, expected",
+    [
+        ("Hello world.", (3, 2, 11, 1)),
+        ("Wait... what?! No.", (6, 3, 16, 3)),  # runs of punctuation are one token and end one sentence
+        ("no punctuation at the end", (5, 5, 21, 1)),
+        ("A: hi there!\nB: hey", (8, 5, 16, 2)),  # only spaces are excluded from n_characters
+        ("", (0, 0, 0, 0)),
+    ],
+)
+def test_fast_descriptive_metrics_counts(text, expected):
+    metrics_df = fast_descriptive_metrics(pd.Series([text]))
+
+    assert tuple(metrics_df.iloc[0]) == expected
+
+
+def test_fast_descriptive_metrics_missing_text():
+    metrics_df = fast_descriptive_metrics(pd.Series(["Hello world.", None], index=[3, 7]))
+
+    assert metrics_df.index.tolist() == [3, 7]
+    assert metrics_df.columns.tolist() == ["doc_length", "n_tokens", "n_characters", "n_sentences"]
+    assert metrics_df.loc[7].tolist() == [0, 0, 0, 0]
+
+
+def test_get_descriptive_metrics_fast_opt_in():
+    df = pd.DataFrame({"id": [1, 2], "text": ["Hello world.", "Wait... what?! No."]})
+
+    final_df = get_descriptive_metrics(df, text_column="text", fast=True)
+
+    assert final_df.columns.tolist() == ["id", "text", "doc_length", "n_tokens", "n_characters", "n_sentences"]
+    assert final_df["n_sentences"].tolist() == [1, 3]